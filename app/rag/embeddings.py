@@ -52,4 +52,13 @@ def get_embeddings_provider() -> EmbeddingsProvider:
         return LocalEmbeddings(settings.local_embedding_model)
     if prov == "fake":
         return FakeEmbeddings()
-    raise ValueError(f"Unsupported EMBEDDING_PROVIDER: {prov}")
\ No newline at end of file
+    raise ValueError(f"Unsupported EMBEDDING_PROVIDER: {prov}")
+
+def get_embedding_space() -> dict:
+    # Identifies the vector space produced by get_embeddings_provider()
+    prov = settings.embedding_provider.lower()
+    if prov == "openai":
+        return {"provider": prov, "model": settings.embedding_model}
+    if prov == "local":
+        return {"provider": prov, "model": settings.local_embedding_model}
+    return {"provider": prov, "model": None}
\ No newline at end of file
@@ -0,0 +1,315 @@
+import hashlib
+import itertools
+import json
+import os
+import struct
+import zlib
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .vector_store import BaseVectorStore
+
+# File layout:
+#   MAGIC | version (u16) | header length (u32) | JSON header {embedding, dim}
+#   records: kind (1 byte) | payload length (u32) | zlib(payload)
+#   sha256 of everything above (32 bytes)
+#
+# Record kinds:
+#   D - JSON list of `documents` table rows
+#   V - vector batch: n (u32) | dim (u32) | float32[n * dim] | JSON {ids, metadatas, documents}
+#   M - JSON chunk manifest {doc_id: number of chunks}
+#   E - JSON totals, always the last record
+SNAPSHOT_MAGIC = b"RAGSNAP\x00"
+SNAPSHOT_VERSION = 1
+DEFAULT_RESTORE_BATCH = 1000
+
+_HEADER = struct.Struct("<HI")
+_RECORD = struct.Struct("<cI")
+_VECTOR_HEAD = struct.Struct("<II")
+_DIGEST_SIZE = hashlib.sha256().digest_size
+
+KIND_DOCUMENTS = b"D"
+KIND_VECTORS = b"V"
+KIND_MANIFEST = b"M"
+KIND_END = b"E"
+
+
+class _HashingWriter:
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        self.sha = hashlib.sha256()
+
+    def write(self, data: bytes):
+        self.sha.update(data)
+        self.f.write(data)
+
+    def record(self, kind: bytes, payload: bytes):
+        body = zlib.compress(payload, 6)
+        self.write(_RECORD.pack(kind, len(body)))
+        self.write(body)
+
+
+def _read_exact(f: BinaryIO, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) != n:
+        raise ValueError(f"{f.name}: truncated")
+    return data
+
+
+def _read_header(f: BinaryIO) -> Tuple[bytes, Dict[str, Any]]:
+    prefix = _read_exact(f, len(SNAPSHOT_MAGIC) + _HEADER.size)
+    if prefix[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{f.name}: not a snapshot (bad magic)")
+    version, length = _HEADER.unpack(prefix[len(SNAPSHOT_MAGIC):])
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"{f.name}: unsupported snapshot version {version}")
+    raw = _read_exact(f, length)
+    return prefix + raw, json.loads(raw)
+
+
+def _dumps(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _encode_vectors(ids: List[str], embeddings, metadatas: List[Dict], documents: List[str]) -> Tuple[bytes, int]:
+    arr = np.asarray(embeddings, dtype="<f4")
+    if arr.ndim != 2 or arr.shape[0] != len(ids):
+        raise ValueError("Embeddings batch does not match ids")
+    n, dim = arr.shape
+    tail = _dumps({"ids": ids, "metadatas": metadatas, "documents": documents})
+    return _VECTOR_HEAD.pack(n, dim) + arr.tobytes() + tail, dim
+
+
+def _decode_vectors(payload: bytes) -> Dict[str, Any]:
+    n, dim = _VECTOR_HEAD.unpack_from(payload)
+    start = _VECTOR_HEAD.size
+    end = start + n * dim * 4
+    arr = np.frombuffer(payload[start:end], dtype="<f4").reshape(n, dim)
+    out = json.loads(payload[end:])
+    # Left as an array; restore converts one upsert-sized slice at a time
+    out["embeddings"] = arr
+    out["dim"] = dim
+    return out
+
+
+def _count_chunks(counts: Dict[str, int], metadatas: List[Dict], ids: Optional[List[str]] = None, only: Optional[set] = None):
+    for i, m in zip(ids or itertools.repeat(None), metadatas):
+        if only is not None and i not in only:
+            continue
+        doc_id = (m or {}).get("doc_id")
+        if doc_id is not None:
+            counts[str(doc_id)] = counts.get(str(doc_id), 0) + 1
+
+
+def _check_manifest(
+    manifest: Dict[str, int],
+    row_chunks: Dict[str, int],
+    stored_chunks: Dict[str, int],
+    num_vectors: int,
+    bad_ids: int,
+) -> List[str]:
+    problems = []
+    for doc_id in sorted(set(manifest) | set(row_chunks) | set(stored_chunks)):
+        expected = manifest.get(doc_id, 0)
+        if doc_id in row_chunks and row_chunks[doc_id] != expected:
+            problems.append(f"document {doc_id}: num_chunks is {row_chunks[doc_id]}, manifest has {expected}")
+        if stored_chunks.get(doc_id, 0) != expected:
+            problems.append(f"document {doc_id}: target holds {stored_chunks.get(doc_id, 0)} vectors, manifest has {expected}")
+    total = sum(manifest.values())
+    if total != num_vectors:
+        problems.append(f"manifest lists {total} chunks, snapshot holds {num_vectors} vectors")
+    if bad_ids:
+        problems.append(f"{bad_ids} vector ids do not match their doc_id:chunk_id metadata")
+    return problems
+
+
+def write_snapshot(
+    path: str,
+    vs: BaseVectorStore,
+    documents: Iterable[Dict],
+    embedding: Dict[str, Any],
+    batch_size: int = 1000,
+) -> Dict[str, int]:
+    """Dump document rows, the vector index and chunk manifests to `path`.
+
+    `embedding` identifies the provider/model the vectors were made with and is
+    stored in the header so restore can refuse an incompatible target.
+    The file is written to a temporary sibling and renamed once complete; the
+    temporary file is removed if the export fails.
+    """
+    tmp = f"{path}.tmp"
+    manifest: Dict[str, int] = {}
+    num_docs = 0
+    num_vectors = 0
+    try:
+        # Peek the first batch so the dimension can go in the header
+        batches = vs.iter_batches(batch_size)
+        first = next(batches, None)
+        dim = len(first.embeddings[0]) if first is not None else 0
+        header = _dumps({"embedding": embedding, "dim": dim})
+        with open(tmp, "wb") as f:
+            w = _HashingWriter(f)
+            w.write(SNAPSHOT_MAGIC + _HEADER.pack(SNAPSHOT_VERSION, len(header)) + header)
+
+            rows: List[Dict] = []
+            for row in documents:
+                rows.append(row)
+                if len(rows) >= batch_size:
+                    w.record(KIND_DOCUMENTS, _dumps(rows))
+                    num_docs += len(rows)
+                    rows = []
+            if rows:
+                w.record(KIND_DOCUMENTS, _dumps(rows))
+                num_docs += len(rows)
+
+            for batch in itertools.chain([first] if first is not None else [], batches):
+                payload, batch_dim = _encode_vectors(batch.ids, batch.embeddings, batch.metadatas, batch.documents)
+                if batch_dim != dim:
+                    raise ValueError(f"Mixed embedding dimensions in store: {dim} and {batch_dim}")
+                w.record(KIND_VECTORS, payload)
+                num_vectors += len(batch.ids)
+                _count_chunks(manifest, batch.metadatas)
+
+            w.record(KIND_MANIFEST, _dumps(manifest))
+            w.record(KIND_END, _dumps({"documents": num_docs, "vectors": num_vectors, "dim": dim}))
+            f.write(w.sha.digest())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return {"documents": num_docs, "vectors": num_vectors, "dim": dim}
+
+
+def read_snapshot_header(path: str) -> Dict[str, Any]:
+    """Return the header ({"embedding": ..., "dim": ...}) without reading records."""
+    with open(path, "rb") as f:
+        return _read_header(f)[1]
+
+
+def verify_snapshot(path: str) -> Dict[str, Any]:
+    """Check magic, version and trailing checksum; raises ValueError if invalid.
+
+    Returns the header.
+    """
+    size = os.path.getsize(path)
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        raw, header = _read_header(f)
+        sha.update(raw)
+        remaining = size - len(raw) - _DIGEST_SIZE
+        if remaining < 0:
+            raise ValueError(f"{path}: truncated")
+        while remaining:
+            block = f.read(min(remaining, 1 << 20))
+            if not block:
+                raise ValueError(f"{path}: truncated")
+            sha.update(block)
+            remaining -= len(block)
+        if _read_exact(f, _DIGEST_SIZE) != sha.digest():
+            raise ValueError(f"{path}: checksum mismatch")
+    return header
+
+
+def iter_snapshot(path: str) -> Iterator[Tuple[bytes, Any]]:
+    """Yield decoded (kind, payload) records. Call verify_snapshot first."""
+    size = os.path.getsize(path)
+    end = size - _DIGEST_SIZE
+    with open(path, "rb") as f:
+        _read_header(f)
+        while f.tell() < end:
+            kind, length = _RECORD.unpack(_read_exact(f, _RECORD.size))
+            try:
+                payload = zlib.decompress(_read_exact(f, length))
+            except zlib.error as e:
+                raise ValueError(f"{path}: corrupt record ({e})") from e
+            if kind == KIND_VECTORS:
+                yield kind, _decode_vectors(payload)
+            else:
+                yield kind, json.loads(payload)
+
+
+def restore_snapshot(
+    path: str,
+    vs: BaseVectorStore,
+    document_sink: Optional[Callable[[List[Dict]], None]] = None,
+    expect_embedding: Optional[Dict[str, Any]] = None,
+    batch_size: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Stream a snapshot into `vs` without re-embedding.
+
+    Vectors are upserted as they are read, re-batched to `batch_size`, which
+    defaults to and is capped at the store's max_batch_size(). Document rows
+    are handed to `document_sink` in batches, if given.
+    If `expect_embedding` is given it must equal the snapshot's embedding
+    space. A dimension clash with vectors already in `vs` is always refused.
+
+    Restored rows, and vectors read back from `vs` by id after each upsert,
+    are checked against the chunk manifest, as is the store's final count.
+    Any disagreement is returned under "problems" rather than raised, since
+    the data has already been written by then.
+    """
+    header = verify_snapshot(path)
+    if expect_embedding is not None and header["embedding"] != expect_embedding:
+        raise ValueError(
+            f"{path}: snapshot embeddings are {header['embedding']}, "
+            f"target is configured for {expect_embedding}"
+        )
+    target_dim = vs.dim()
+    if target_dim and header["dim"] and target_dim != header["dim"]:
+        raise ValueError(f"{path}: snapshot dim {header['dim']} does not match store dim {target_dim}")
+    limit = vs.max_batch_size()
+    size = batch_size or limit or DEFAULT_RESTORE_BATCH
+    if limit:
+        size = min(size, limit)
+    start_count = vs.count()
+    num_docs = 0
+    num_vectors = 0
+    manifest: Dict[str, int] = {}
+    row_chunks: Dict[str, int] = {}
+    stored_chunks: Dict[str, int] = {}
+    bad_ids = 0
+    totals: Optional[Dict[str, int]] = None
+    for kind, payload in iter_snapshot(path):
+        if kind == KIND_DOCUMENTS:
+            if document_sink is not None:
+                document_sink(payload)
+            for row in payload:
+                if row.get("num_chunks") is not None:
+                    row_chunks[str(row["id"])] = row["num_chunks"]
+            num_docs += len(payload)
+        elif kind == KIND_VECTORS:
+            for start in range(0, len(payload["ids"]), size):
+                end = start + size
+                ids = payload["ids"][start:end]
+                metas = payload["metadatas"][start:end]
+                vs.upsert(
+                    ids=ids,
+                    embeddings=payload["embeddings"][start:end].tolist(),
+                    metadatas=metas,
+                    documents=payload["documents"][start:end],
+                )
+                _count_chunks(stored_chunks, metas, ids, only=set(vs.existing_ids(ids)))
+            num_vectors += len(payload["ids"])
+            for i, m in zip(payload["ids"], payload["metadatas"]):
+                m = m or {}
+                if i != f"{m.get('doc_id')}:{m.get('chunk_id')}":
+                    bad_ids += 1
+        elif kind == KIND_MANIFEST:
+            manifest = payload
+        elif kind == KIND_END:
+            totals = payload
+        else:
+            raise ValueError(f"{path}: unknown record kind {kind!r}")
+    if totals is None:
+        raise ValueError(f"{path}: missing end record")
+    if totals["documents"] != num_docs or totals["vectors"] != num_vectors:
+        raise ValueError(f"{path}: record counts do not match end record")
+    problems = _check_manifest(manifest, row_chunks, stored_chunks, num_vectors, bad_ids)
+    final_count = vs.count()
+    if start_count == 0 and final_count != num_vectors:
+        problems.append(f"target holds {final_count} vectors after restoring {num_vectors} into an empty store")
+    elif final_count < num_vectors:
+        problems.append(f"target holds {final_count} vectors, fewer than the {num_vectors} restored")
+    return {"documents": num_docs, "vectors": num_vectors, "dim": totals["dim"], "problems": problems}
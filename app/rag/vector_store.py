@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 from dataclasses import dataclass
 
 import numpy as np
@@ -12,6 +12,13 @@ class SearchResult:
     documents: List[str]
     distances: List[float]
 
+@dataclass
+class StoredBatch:
+    ids: List[str]
+    embeddings: List[List[float]]
+    metadatas: List[Dict[str, Any]]
+    documents: List[str]
+
 class BaseVectorStore:
     def upsert(self, ids: List[str], embeddings: List[List[float]], metadatas: List[Dict], documents: List[str]):
         raise NotImplementedError
@@ -19,6 +26,25 @@ class BaseVectorStore:
     def query(self, embedding: List[float], top_k: int, where: Optional[Dict] = None) -> SearchResult:
         raise NotImplementedError
 
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def dim(self) -> Optional[int]:
+        # Embedding dimension of stored records, None when empty
+        raise NotImplementedError
+
+    def max_batch_size(self) -> Optional[int]:
+        # Largest upsert the backend accepts, None when unbounded
+        return None
+
+    def existing_ids(self, ids: List[str]) -> List[str]:
+        # Subset of `ids` present in the store, used to verify restores
+        raise NotImplementedError
+
+    def iter_batches(self, batch_size: int) -> Iterator[StoredBatch]:
+        # Yields every stored record, used by snapshot export
+        raise NotImplementedError
+
 class ChromaVectorStore(BaseVectorStore):
     def __init__(self, collection_name: str):
         import chromadb
@@ -42,6 +68,40 @@ class ChromaVectorStore(BaseVectorStore):
             distances=res.get("distances", [[]])[0] or res.get("distances", [[]])[0]
         )
 
+    def count(self) -> int:
+        return self.collection.count()
+
+    def dim(self) -> Optional[int]:
+        res = self.collection.peek(limit=1)
+        embeds = res.get("embeddings")
+        if embeds is None or len(embeds) == 0:
+            return None
+        return len(embeds[0])
+
+    def max_batch_size(self) -> Optional[int]:
+        return self.client.max_batch_size
+
+    def existing_ids(self, ids: List[str]) -> List[str]:
+        return self.collection.get(ids=ids, include=[])["ids"]
+
+    def iter_batches(self, batch_size: int) -> Iterator[StoredBatch]:
+        # Offset paging rescans the collection for every page, so list the ids
+        # once and fetch each batch by id instead
+        all_ids = self.collection.get(include=[])["ids"]
+        for start in range(0, len(all_ids), batch_size):
+            res = self.collection.get(
+                ids=all_ids[start:start + batch_size],
+                include=["embeddings", "metadatas", "documents"],
+            )
+            if not res["ids"]:
+                continue
+            yield StoredBatch(
+                ids=res["ids"],
+                embeddings=[list(e) for e in res["embeddings"]],
+                metadatas=res["metadatas"],
+                documents=res["documents"],
+            )
+
 class InMemoryVectorStore(BaseVectorStore):
     # Simple cosine search for tests
     def __init__(self):
@@ -49,11 +109,18 @@ class InMemoryVectorStore(BaseVectorStore):
         self._ids: List[str] = []
         self._metas: List[Dict] = []
         self._docs: List[str] = []
+        self._pos: Dict[str, int] = {}
 
     def upsert(self, ids, embeddings, metadatas, documents):
         for i, e, m, d in zip(ids, embeddings, metadatas, documents):
+            e = np.array(e, dtype=np.float32)
+            if i in self._pos:
+                idx = self._pos[i]
+                self._embeds[idx], self._metas[idx], self._docs[idx] = e, m, d
+                continue
+            self._pos[i] = len(self._ids)
             self._ids.append(i)
-            self._embeds.append(np.array(e, dtype=np.float32))
+            self._embeds.append(e)
             self._metas.append(m)
             self._docs.append(d)
 
@@ -86,6 +153,25 @@ class InMemoryVectorStore(BaseVectorStore):
             distances=[1 - s for s, _ in sims],
         )
 
+    def count(self) -> int:
+        return len(self._ids)
+
+    def dim(self) -> Optional[int]:
+        return len(self._embeds[0]) if self._embeds else None
+
+    def existing_ids(self, ids: List[str]) -> List[str]:
+        return [i for i in ids if i in self._pos]
+
+    def iter_batches(self, batch_size: int) -> Iterator[StoredBatch]:
+        for start in range(0, len(self._ids), batch_size):
+            end = start + batch_size
+            yield StoredBatch(
+                ids=self._ids[start:end],
+                embeddings=[e.tolist() for e in self._embeds[start:end]],
+                metadatas=self._metas[start:end],
+                documents=self._docs[start:end],
+            )
+
 def get_vector_store() -> BaseVectorStore:
     if settings.vector_store.lower() == "chroma":
         return ChromaVectorStore(settings.chroma_collection)
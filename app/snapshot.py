@@ -0,0 +1,109 @@
+"""Export/restore the document index for bootstrapping replicas.
+
+    python -m app.snapshot export /backups/index.snap
+    python -m app.snapshot restore /backups/index.snap
+
+Restore writes stored embeddings straight into the configured vector store and
+never calls the embeddings provider. Uploaded source files are not included.
+Only persistent stores are supported here; VECTOR_STORE=memory lives and dies
+with one process, so use app.rag.snapshot directly for it.
+"""
+import argparse
+import sys
+import uuid
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+from .settings import settings
+from .database import init_db
+from .deps import get_session
+from . import models
+from .rag.embeddings import get_embedding_space
+from .rag.vector_store import get_vector_store
+from .rag.snapshot import write_snapshot, restore_snapshot
+
+DOCUMENT_FIELDS = [
+    "id", "file_name", "content_type", "source_path", "num_pages",
+    "num_chunks", "status", "error", "created_at", "updated_at",
+]
+
+def document_to_row(d: models.Document) -> Dict:
+    row = {}
+    for name in DOCUMENT_FIELDS:
+        v = getattr(d, name)
+        if isinstance(v, uuid.UUID):
+            v = str(v)
+        elif isinstance(v, datetime):
+            v = v.isoformat()
+        row[name] = v
+    return row
+
+def row_to_document(row: Dict) -> models.Document:
+    values = dict(row)
+    values["id"] = uuid.UUID(values["id"])
+    for name in ("created_at", "updated_at"):
+        if values.get(name):
+            values[name] = datetime.fromisoformat(values[name])
+    return models.Document(**values)
+
+def _iter_documents(session, batch_size: int) -> Iterator[Dict]:
+    q = session.query(models.Document).order_by(models.Document.id).yield_per(batch_size)
+    for d in q:
+        yield document_to_row(d)
+
+def _persistent_vector_store():
+    if settings.vector_store.lower() == "memory":
+        raise ValueError("VECTOR_STORE=memory is per-process and cannot be snapshotted from the CLI")
+    return get_vector_store()
+
+def export_index(path: str, batch_size: int = 1000) -> Dict:
+    vs = _persistent_vector_store()
+    with get_session() as session:
+        return write_snapshot(
+            path, vs, _iter_documents(session, batch_size),
+            embedding=get_embedding_space(), batch_size=batch_size,
+        )
+
+def restore_index(path: str, force: bool = False, batch_size: int | None = None) -> Dict:
+    vs = _persistent_vector_store()
+    init_db()
+
+    def sink(rows: List[Dict]):
+        # One transaction per batch keeps memory flat on large restores
+        with get_session() as session:
+            for row in rows:
+                session.merge(row_to_document(row))
+
+    expect = None if force else get_embedding_space()
+    return restore_snapshot(path, vs, document_sink=sink, expect_embedding=expect, batch_size=batch_size)
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m app.snapshot", description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="write a snapshot of the current index")
+    p_export.add_argument("path")
+    p_export.add_argument("--batch-size", type=int, default=1000)
+    p_restore = sub.add_parser("restore", help="load a snapshot into the configured stores")
+    p_restore.add_argument("path")
+    p_restore.add_argument("--force", action="store_true",
+                           help="restore even if the snapshot's embedding provider/model differs from settings")
+    p_restore.add_argument("--batch-size", type=int, default=None,
+                           help="vectors per upsert; defaults to and is capped at the store's limit")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "export":
+            stats = export_index(args.path, batch_size=args.batch_size)
+        else:
+            stats = restore_index(args.path, force=args.force, batch_size=args.batch_size)
+    except (ValueError, OSError) as e:
+        parser.exit(1, f"error: {e}\n")
+    print(f"{args.command}: {stats['documents']} documents, {stats['vectors']} vectors (dim={stats['dim']})")
+    problems = stats.get("problems") or []
+    for p in problems:
+        print(f"warning: {p}", file=sys.stderr)
+    if problems:
+        parser.exit(1, f"restore finished with {len(problems)} manifest mismatches\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import struct
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import snapshot as snapshot_cli
+from app import models
+from app.database import Base
+from app.settings import settings
+
+from app.rag.snapshot import write_snapshot, restore_snapshot, verify_snapshot, SNAPSHOT_MAGIC
+from app.rag.vector_store import InMemoryVectorStore, ChromaVectorStore
+
+SPACE = {"provider": "openai", "model": "text-embedding-3-small"}
+
+def _small_snapshot(path, embedding=SPACE, dim=2):
+    src = InMemoryVectorStore()
+    src.upsert(ids=["x:0"], embeddings=[[1.0] + [0.0] * (dim - 1)], metadatas=[{"doc_id": "x", "chunk_id": 0}], documents=["hi"])
+    write_snapshot(str(path), src, [{"id": "x", "num_chunks": 1}], embedding=embedding)
+
+def test_snapshot_round_trip(tmp_path):
+    src = InMemoryVectorStore()
+    doc_id = "00000000-0000-0000-0000-000000000001"
+    ids = [f"{doc_id}:{i}" for i in range(5)]
+    embeds = [[float(i), 1.0, 0.5] for i in range(5)]
+    metas = [{"doc_id": doc_id, "chunk_id": i, "token_count": 10, "file_name": "a.txt", "page": None} for i in range(5)]
+    docs = [f"chunk {i}" for i in range(5)]
+    src.upsert(ids=ids, embeddings=embeds, metadatas=metas, documents=docs)
+    rows = [{"id": doc_id, "file_name": "a.txt", "num_chunks": 5}]
+
+    path = str(tmp_path / "index.snap")
+    stats = write_snapshot(path, src, rows, embedding=SPACE, batch_size=2)
+    assert stats == {"documents": 1, "vectors": 5, "dim": 3}
+
+    dst = InMemoryVectorStore()
+    restored_rows = []
+    out = restore_snapshot(path, dst, document_sink=restored_rows.extend, expect_embedding=SPACE)
+    assert restored_rows == rows
+    assert dst.count() == 5
+    assert out["problems"] == []
+    res = dst.query(embedding=embeds[4], top_k=1)
+    assert res.ids == [ids[4]]
+    assert res.documents == ["chunk 4"]
+
+def test_snapshot_rejects_corruption(tmp_path):
+    path = tmp_path / "index.snap"
+    _small_snapshot(path)
+    data = bytearray(path.read_bytes())
+    data[20] ^= 0xFF
+    path.write_bytes(bytes(data))
+    dst = InMemoryVectorStore()
+    with pytest.raises(ValueError):
+        restore_snapshot(str(path), dst)
+    assert dst.count() == 0
+
+
+def test_snapshot_rejects_other_embedding_space(tmp_path):
+    path = tmp_path / "index.snap"
+    _small_snapshot(path)
+    dst = InMemoryVectorStore()
+    with pytest.raises(ValueError, match="configured for"):
+        restore_snapshot(str(path), dst, expect_embedding={"provider": "local", "model": "sentence-transformers/all-MiniLM-L6-v2"})
+    assert dst.count() == 0
+    # Without an expectation (CLI --force) the snapshot is accepted
+    restore_snapshot(str(path), dst)
+    assert dst.count() == 1
+
+def test_snapshot_rejects_dim_clash_with_store(tmp_path):
+    path = tmp_path / "index.snap"
+    _small_snapshot(path, dim=3)
+    dst = InMemoryVectorStore()
+    dst.upsert(ids=["y:0"], embeddings=[[1.0, 0.0]], metadatas=[{"doc_id": "y", "chunk_id": 0}], documents=["yo"])
+    with pytest.raises(ValueError, match="dim"):
+        restore_snapshot(str(path), dst)
+    assert dst.count() == 1
+
+def test_snapshot_rejects_truncated(tmp_path):
+    path = tmp_path / "index.snap"
+    _small_snapshot(path)
+    data = path.read_bytes()
+    path.write_bytes(data[:-40])
+    with pytest.raises(ValueError):
+        verify_snapshot(str(path))
+    path.write_bytes(data[:10])
+    with pytest.raises(ValueError, match="truncated"):
+        verify_snapshot(str(path))
+
+def test_snapshot_rejects_bad_magic_and_version(tmp_path):
+    path = tmp_path / "index.snap"
+    _small_snapshot(path)
+    data = path.read_bytes()
+    path.write_bytes(b"NOTASNAP" + data[8:])
+    with pytest.raises(ValueError, match="bad magic"):
+        verify_snapshot(str(path))
+    path.write_bytes(SNAPSHOT_MAGIC + struct.pack("<H", 99) + data[10:])
+    with pytest.raises(ValueError, match="version 99"):
+        verify_snapshot(str(path))
+
+def test_snapshot_reports_manifest_mismatch(tmp_path):
+    src = InMemoryVectorStore()
+    src.upsert(ids=["x:0", "x:1"], embeddings=[[1.0, 0.0], [0.0, 1.0]],
+               metadatas=[{"doc_id": "x", "chunk_id": 0}, {"doc_id": "x", "chunk_id": 1}], documents=["a", "b"])
+    path = tmp_path / "index.snap"
+    write_snapshot(str(path), src, [{"id": "x", "num_chunks": 3}, {"id": "y", "num_chunks": 0}], embedding=SPACE)
+    out = restore_snapshot(str(path), InMemoryVectorStore())
+    assert out["problems"] == ["document x: num_chunks is 3, manifest has 2"]
+
+def test_document_row_round_trip():
+    d = models.Document(
+        id=uuid.uuid4(), file_name="a.pdf", content_type="application/pdf", source_path="/data/uploads/a.pdf",
+        num_pages=3, num_chunks=7, status="processed", error=None,
+        created_at=datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc), updated_at=None,
+    )
+    row = snapshot_cli.document_to_row(d)
+    assert row["id"] == str(d.id)
+    assert row["created_at"] == "2024-05-01T12:00:00+00:00"
+    assert row["updated_at"] is None
+    back = snapshot_cli.row_to_document(row)
+    for name in snapshot_cli.DOCUMENT_FIELDS:
+        assert getattr(back, name) == getattr(d, name)
+
+@pytest.fixture
+def cli_env(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_session():
+        session = Session()
+        try:
+            yield session
+            session.commit()
+        finally:
+            session.close()
+
+    monkeypatch.setattr(snapshot_cli, "get_session", get_session)
+    monkeypatch.setattr(snapshot_cli, "init_db", lambda: Base.metadata.create_all(bind=engine))
+    monkeypatch.setattr(settings, "vector_store", "chroma")
+    monkeypatch.setattr(settings, "embedding_provider", "openai")
+    monkeypatch.setattr(settings, "embedding_model", "text-embedding-3-small")
+    return get_session
+
+def test_cli_export_and_repeated_restore(tmp_path, monkeypatch, cli_env):
+    snapshot_cli.init_db()
+    doc_id = uuid.uuid4()
+    with cli_env() as session:
+        session.add(models.Document(id=doc_id, file_name="a.txt", content_type="text/plain",
+                                    source_path="/data/uploads/a.txt", num_pages=1, num_chunks=2, status="processed"))
+    src = InMemoryVectorStore()
+    src.upsert(ids=[f"{doc_id}:0", f"{doc_id}:1"], embeddings=[[1.0, 0.0], [0.0, 1.0]],
+               metadatas=[{"doc_id": str(doc_id), "chunk_id": 0}, {"doc_id": str(doc_id), "chunk_id": 1}],
+               documents=["a", "b"])
+    monkeypatch.setattr(snapshot_cli, "get_vector_store", lambda: src)
+    path = str(tmp_path / "index.snap")
+    assert snapshot_cli.export_index(path)["vectors"] == 2
+
+    dst = InMemoryVectorStore()
+    monkeypatch.setattr(snapshot_cli, "get_vector_store", lambda: dst)
+    for _ in range(2):
+        out = snapshot_cli.restore_index(path)
+        assert out["problems"] == []
+        assert dst.count() == 2
+    with cli_env() as session:
+        docs = session.query(models.Document).all()
+        assert [(d.id, d.num_chunks) for d in docs] == [(doc_id, 2)]
+
+    monkeypatch.setattr(settings, "embedding_provider", "local")
+    with pytest.raises(ValueError, match="configured for"):
+        snapshot_cli.restore_index(path)
+    assert snapshot_cli.restore_index(path, force=True)["vectors"] == 2
+    assert dst.count() == 2
+
+def test_cli_rejects_memory_store(tmp_path, monkeypatch, cli_env):
+    monkeypatch.setattr(settings, "vector_store", "memory")
+    with pytest.raises(ValueError, match="memory"):
+        snapshot_cli.export_index(str(tmp_path / "index.snap"))
+    with pytest.raises(SystemExit) as exc:
+        snapshot_cli.main(["restore", str(tmp_path / "index.snap")])
+    assert exc.value.code == 1
+
+class _StubCollection:
+    def __init__(self, n):
+        self.rows = {f"d:{i}": ([float(i), 1.0], {"doc_id": "d", "chunk_id": i}, f"text {i}") for i in range(n)}
+        self.calls = []
+
+    def get(self, ids=None, include=None):
+        self.calls.append((ids, include))
+        picked = list(self.rows) if ids is None else [i for i in ids if i in self.rows]
+        res = {"ids": picked}
+        if include:
+            res["embeddings"] = [self.rows[i][0] for i in picked]
+            res["metadatas"] = [self.rows[i][1] for i in picked]
+            res["documents"] = [self.rows[i][2] for i in picked]
+        return res
+
+def test_chroma_iter_batches_fetches_by_id():
+    vs = ChromaVectorStore.__new__(ChromaVectorStore)
+    vs.collection = _StubCollection(5)
+    batches = list(vs.iter_batches(2))
+    assert [b.ids for b in batches] == [["d:0", "d:1"], ["d:2", "d:3"], ["d:4"]]
+    assert batches[2].embeddings == [[4.0, 1.0]]
+    assert batches[2].documents == ["text 4"]
+    # one id listing, then one fetch per batch; no offset paging
+    assert vs.collection.calls[0] == (None, [])
+    assert [c[0] for c in vs.collection.calls[1:]] == [["d:0", "d:1"], ["d:2", "d:3"], ["d:4"]]
+
+def test_chroma_iter_batches_empty_and_deleted():
+    vs = ChromaVectorStore.__new__(ChromaVectorStore)
+    vs.collection = _StubCollection(0)
+    assert list(vs.iter_batches(2)) == []
+
+    vs.collection = _StubCollection(3)
+    get = vs.collection.get
+
+    def get_then_delete(ids=None, include=None):
+        res = get(ids=ids, include=include)
+        if ids is None:
+            vs.collection.rows.pop("d:0")
+            vs.collection.rows.pop("d:1")
+        return res
+
+    vs.collection.get = get_then_delete
+    assert [b.ids for b in vs.iter_batches(2)] == [["d:2"]]
+
+class _LimitedStore(InMemoryVectorStore):
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.upserts = []
+
+    def max_batch_size(self):
+        return self.limit
+
+    def upsert(self, ids, embeddings, metadatas, documents):
+        assert isinstance(embeddings, list) and isinstance(embeddings[0], list)
+        self.upserts.append(len(ids))
+        super().upsert(ids, embeddings, metadatas, documents)
+
+def test_restore_rebatches_to_store_limit(tmp_path):
+    src = InMemoryVectorStore()
+    src.upsert(ids=[f"d:{i}" for i in range(5)], embeddings=[[float(i), 1.0] for i in range(5)],
+               metadatas=[{"doc_id": "d", "chunk_id": i} for i in range(5)], documents=["t"] * 5)
+    path = str(tmp_path / "index.snap")
+    write_snapshot(path, src, [], embedding=SPACE, batch_size=5)
+
+    dst = _LimitedStore(limit=2)
+    restore_snapshot(path, dst)
+    assert dst.upserts == [2, 2, 1]
+
+    # An explicit batch size is honoured but never exceeds the limit
+    dst = _LimitedStore(limit=3)
+    restore_snapshot(path, dst, batch_size=1)
+    assert dst.upserts == [1] * 5
+    dst = _LimitedStore(limit=3)
+    restore_snapshot(path, dst, batch_size=10)
+    assert dst.upserts == [3, 2]
+
+class _LossyStore(InMemoryVectorStore):
+    # Accepts every upsert but silently drops odd chunk ids
+    def upsert(self, ids, embeddings, metadatas, documents):
+        keep = [k for k, m in enumerate(metadatas) if m["chunk_id"] % 2 == 0]
+        super().upsert([ids[k] for k in keep], [embeddings[k] for k in keep],
+                       [metadatas[k] for k in keep], [documents[k] for k in keep])
+
+def test_restore_reads_back_from_target(tmp_path):
+    src = InMemoryVectorStore()
+    src.upsert(ids=[f"d:{i}" for i in range(4)], embeddings=[[float(i), 1.0] for i in range(4)],
+               metadatas=[{"doc_id": "d", "chunk_id": i} for i in range(4)], documents=["t"] * 4)
+    path = str(tmp_path / "index.snap")
+    write_snapshot(path, src, [{"id": "d", "num_chunks": 4}], embedding=SPACE)
+    out = restore_snapshot(path, _LossyStore())
+    assert out["problems"] == [
+        "document d: target holds 2 vectors, manifest has 4",
+        "target holds 2 vectors after restoring 4 into an empty store",
+    ]
+
+def test_memory_store_upsert_replaces():
+    vs = InMemoryVectorStore()
+    vs.upsert(ids=["a"], embeddings=[[1.0, 0.0]], metadatas=[{"v": 1}], documents=["old"])
+    vs.upsert(ids=["a", "b"], embeddings=[[0.0, 1.0], [1.0, 1.0]], metadatas=[{"v": 2}, {"v": 3}], documents=["new", "b"])
+    assert vs.count() == 2
+    res = vs.query(embedding=[0.0, 1.0], top_k=1)
+    assert res.ids == ["a"] and res.documents == ["new"]
+
+def test_failed_export_removes_tmp_file(tmp_path):
+    src = InMemoryVectorStore()
+    src.upsert(ids=["a:0", "b:0"], embeddings=[[1.0, 0.0], [1.0, 0.0, 0.0]],
+               metadatas=[{"doc_id": "a", "chunk_id": 0}, {"doc_id": "b", "chunk_id": 0}], documents=["a", "b"])
+    with pytest.raises(ValueError, match="Mixed embedding dimensions"):
+        write_snapshot(str(tmp_path / "index.snap"), src, [], embedding=SPACE, batch_size=1)
+    assert list(tmp_path.iterdir()) == []
+
+def test_cli_reports_missing_snapshot(tmp_path, capsys, monkeypatch, cli_env):
+    monkeypatch.setattr(snapshot_cli, "get_vector_store", InMemoryVectorStore)
+    with pytest.raises(SystemExit) as exc:
+        snapshot_cli.main(["restore", str(tmp_path / "missing.snap")])
+    assert exc.value.code == 1
+    assert "error:" in capsys.readouterr().err